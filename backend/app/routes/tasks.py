@@ -66,7 +66,7 @@ def get_task_by_id(task_id: str):
         task_information = get_task_status(task_id)
         current_app.logger.debug(f"Status for TaskID '{task_id} from service: {task_information}")
 
-        return jsonify(task_information), 200
+        return jsonify(task_information.to_dict()), 200
         
     except HTTPException as http_exc:
         # Re-raise Werkzeug HTTPExceptions (like the 404 from first_or_404)
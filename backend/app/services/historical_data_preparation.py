@@ -14,6 +14,32 @@ from datetime import date, datetime
 from decimal import Decimal, InvalidOperation
 import json
 
+# Decimal constants reused for every processed row instead of being rebuilt per row.
+_ZERO = Decimal(0)
+_ONE = Decimal(1)
+_HUNDRED = Decimal(100)
+# Using a small tolerance for floating-point/decimal precision issues when validating
+# that reallocation percentages sum to 1 (100%).
+_ALLOCATION_SUM_TOLERANCE = Decimal('0.001') # 0.1% tolerance
+# Number of reallocation rows fetched per batch while streaming them from the database,
+# so large portfolios don't hold every row (and its JSON string) in memory at once.
+_REALLOCATION_YIELD_PER = 500
+
+# --- Helper Functions ---
+
+def _loads_json(raw_json):
+    """Returns the decoded value of a JSON column.
+
+    `db.JSON` columns already come back decoded (e.g., as a dict), so only a raw
+    `str`/`bytes` document is parsed with `json.loads`; anything else is returned as-is.
+
+    Raises:
+        json.JSONDecodeError: If a raw document is malformed.
+    """
+    if isinstance(raw_json, (str, bytes)):
+        return json.loads(raw_json)
+    return raw_json
+
 # --- Data Fetching and Preparation Functions ---
 
 def fetch_and_process_asset_data(portfolio_id: int) -> dict:
@@ -39,12 +65,19 @@ def fetch_and_process_asset_data(portfolio_id: int) -> dict:
     """
     current_app.logger.debug(f"Fetching and processing asset data for PortfolioID '{portfolio_id}'.")
     assets_data = {}
-    # Query all assets belonging to the specified portfolio.
-    portfolio_assets_db = db.session.query(Asset).filter(Asset.portfolio_id == portfolio_id).all()
+    # Query only the columns used below for all assets belonging to the specified portfolio.
+    # Column queries return lightweight rows instead of full ORM instances (no identity map
+    # bookkeeping or relationship attributes), which is all this read-only processing needs.
+    portfolio_assets_db = db.session.query(
+        Asset.asset_id,
+        Asset.manual_expected_return,
+        Asset.allocation_percentage,
+        Asset.created_at
+    ).filter(Asset.portfolio_id == portfolio_id).all()
     
     for asset_db in portfolio_assets_db:
         manual_return_decimal = None
-        base_alloc_perc_decimal = Decimal(0) # Default to 0 allocation
+        base_alloc_perc_decimal = _ZERO # Default to 0 allocation
 
         try:
             # Process manual_expected_return: stored as numeric in DB (e.g., 7.5 for 7.5%)
@@ -55,7 +88,7 @@ def fetch_and_process_asset_data(portfolio_id: int) -> dict:
             # Process allocation_percentage: stored as numeric (e.g., 50 for 50%)
             # Convert to a decimal fraction (e.g., 0.50 for 50%).
             if asset_db.allocation_percentage is not None:
-                base_alloc_perc_decimal = Decimal(asset_db.allocation_percentage) / Decimal(100)
+                base_alloc_perc_decimal = Decimal(asset_db.allocation_percentage) / _HUNDRED
                 
         except InvalidOperation as e:
             # Log error if decimal conversion fails for critical financial data.
@@ -101,31 +134,34 @@ def fetch_and_process_reallocations(portfolio_id: int, end_date: date) -> list:
     """
     current_app.logger.debug(f"Fetching reallocations for PortfolioID '{portfolio_id}' up to {end_date.isoformat()}.")
     processed_reallocations = []
-    # Query for reallocation events, ordered by date.
-    reallocation_changes_db = db.session.query(PlannedFutureChange).filter(
+    # Query for reallocation events, ordered by date (only the columns used below).
+    # Rows are streamed in batches and processed as they arrive rather than loaded with `.all()`.
+    reallocation_changes_db = db.session.query(
+        PlannedFutureChange.change_id,
+        PlannedFutureChange.change_date,
+        PlannedFutureChange.target_allocation_json
+    ).filter(
         PlannedFutureChange.portfolio_id == portfolio_id,
         PlannedFutureChange.change_type == ChangeType.REALLOCATION, # Use Enum member
         PlannedFutureChange.change_date <= end_date
-    ).order_by(PlannedFutureChange.change_date).all()
+    ).order_by(PlannedFutureChange.change_date).execution_options(yield_per=_REALLOCATION_YIELD_PER)
 
     for realloc_db in reallocation_changes_db:
         if realloc_db.target_allocation_json: # Ensure JSON data exists
             try:
                 # `target_allocation_json` is expected to be like: {"asset_id_str": "percentage_str", ...}
-                target_alloc_dict_str_keys = json.loads(realloc_db.target_allocation_json)
+                # It is a JSON column, so it normally arrives already decoded as a dict.
+                target_alloc_dict_str_keys = _loads_json(realloc_db.target_allocation_json)
                 
                 # Convert keys to int and values to Decimal fractions (e.g., "50" -> Decimal('0.50'))
                 target_alloc_decimal_values = {
-                    int(asset_id_str): Decimal(perc_str) / Decimal(100) 
+                    int(asset_id_str): Decimal(perc_str) / _HUNDRED
                     for asset_id_str, perc_str in target_alloc_dict_str_keys.items()
                 }
                 
                 # Validate that the sum of allocations is close to 1 (100%).
                 sum_of_allocations = sum(target_alloc_decimal_values.values())
-                # Using a small tolerance for floating-point/decimal precision issues.
-                tolerance = Decimal('0.001') # 0.1% tolerance
-
-                if abs(sum_of_allocations - Decimal(1)) > tolerance:
+                if abs(sum_of_allocations - _ONE) > _ALLOCATION_SUM_TOLERANCE:
                     current_app.logger.warning(
                         f"Reallocation (ChangeID '{realloc_db.change_id}', Date '{realloc_db.change_date}') "
                         f"for PortfolioID '{portfolio_id}' has target allocations summing to {sum_of_allocations:.4f} (not 1.0). "
@@ -165,15 +201,20 @@ def get_daily_changes(portfolio_id: int, end_date: date) -> dict:
     """
     current_app.logger.debug(f"Fetching daily cash flow changes for PortfolioID '{portfolio_id}' up to {end_date.isoformat()}.")
     changes_by_date = {}
-    # Query for contribution and withdrawal events, ordered by date.
-    all_relevant_changes = db.session.query(PlannedFutureChange).filter(
+    # Query for contribution and withdrawal events, ordered by date (only the columns used below).
+    all_relevant_changes = db.session.query(
+        PlannedFutureChange.change_id,
+        PlannedFutureChange.change_date,
+        PlannedFutureChange.change_type,
+        PlannedFutureChange.amount
+    ).filter(
         PlannedFutureChange.portfolio_id == portfolio_id,
         PlannedFutureChange.change_date <= end_date,
         PlannedFutureChange.change_type.in_([ChangeType.CONTRIBUTION, ChangeType.WITHDRAWAL]) # Use Enum members
     ).order_by(PlannedFutureChange.change_date).all()
 
     for change in all_relevant_changes:
-        amount_decimal = Decimal(0) # Default to 0 if amount is None or invalid
+        amount_decimal = _ZERO # Default to 0 if amount is None or invalid
         try:
             if change.amount is not None:
                 amount_decimal = Decimal(change.amount)
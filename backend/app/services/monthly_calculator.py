@@ -8,7 +8,7 @@ at the end of a single month.
 """
 import datetime
 from decimal import Decimal, InvalidOperation
-from typing import List, Dict, Tuple, Callable
+from typing import List, Dict, Tuple, Callable, Optional
 import logging # Added logging
 import json # Added json import
 from app.models import PlannedFutureChange # Assuming PlannedFutureChange is used here
@@ -17,9 +17,31 @@ from app.enums import ChangeType # Assuming ChangeType is used here
 # Initialize a logger for this module. This is standard practice for logging within applications.
 logger = logging.getLogger(__name__) 
 
+# Shared immutable Decimal constants used in the per-asset arithmetic below.
+_ZERO = Decimal('0.0')
+_ONE = Decimal('1')
+
+def precompute_growth_factors(
+    monthly_asset_returns: Dict[int, Decimal] # Asset ID -> Monthly Return Rate
+) -> Dict[int, Decimal]:
+    """Converts monthly return rates into monthly growth factors (`1 + rate`).
+
+    Monthly returns are fixed for the whole projection, so callers that project many
+    months can compute the factors once and pass them to `calculate_single_month`.
+
+    Args:
+        monthly_asset_returns: A dictionary mapping asset IDs to their expected monthly
+                               return rates (as decimal fractions, e.g., 0.01 for 1%).
+
+    Returns:
+        Dict[int, Decimal]: Asset IDs mapped to `1 + monthly return rate`.
+    """
+    return {asset_id: _ONE + monthly_return for asset_id, monthly_return in monthly_asset_returns.items()}
+
 def _apply_monthly_growth(
     current_asset_values: Dict[int, Decimal], # Asset ID -> Current Value
-    monthly_asset_returns: Dict[int, Decimal] # Asset ID -> Monthly Return Rate (as decimal, e.g., 0.01 for 1%)
+    monthly_asset_returns: Dict[int, Decimal], # Asset ID -> Monthly Return Rate (as decimal, e.g., 0.01 for 1%)
+    growth_factors: Optional[Dict[int, Decimal]] = None # Asset ID -> 1 + Monthly Return Rate, if precomputed
 ) -> Tuple[Dict[int, Decimal], Decimal]:
     """Applies expected monthly growth to each asset's current value.
 
@@ -27,6 +49,8 @@ def _apply_monthly_growth(
         current_asset_values: A dictionary mapping asset IDs to their current Decimal values.
         monthly_asset_returns: A dictionary mapping asset IDs to their expected monthly
                                return rates (as decimal fractions, e.g., 0.01 for 1%).
+        growth_factors: Optional output of `precompute_growth_factors` for the same returns.
+                        When given, each asset is grown with a single multiplication.
 
     Returns:
         A tuple containing:
@@ -35,25 +59,36 @@ def _apply_monthly_growth(
             - total_value_pre_cashflow (Decimal): Total portfolio value after growth,
                                                   before cash flows.
     """
-    logger.debug(f"Applying monthly growth. Current asset values: {json.dumps({k: str(v) for k, v in current_asset_values.items()}) if current_asset_values else 'None'}. "
-                 f"Monthly asset returns: {json.dumps({k: str(v) for k, v in monthly_asset_returns.items()}) if monthly_asset_returns else 'None'}")
+    # The debug payload serialises every asset, so only build it when it will actually be emitted.
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Applying monthly growth. Current asset values: {json.dumps({k: str(v) for k, v in current_asset_values.items()}) if current_asset_values else 'None'}. "
+                     f"Monthly asset returns: {json.dumps({k: str(v) for k, v in monthly_asset_returns.items()}) if monthly_asset_returns else 'None'}")
     value_i_pre_cashflow = {} # Stores individual asset values after growth
     total_value_pre_cashflow = Decimal('0.0') # Accumulates total portfolio value after growth
 
-    for asset_id, current_value in current_asset_values.items():
-        # Ensure current_value is Decimal for precision
-        current_value_dec = Decimal(current_value) 
-        
-        # Calculate growth for the asset
-        # monthly_asset_returns[asset_id] is the expected return rate for this asset for the month
-        growth_amount = current_value_dec * monthly_asset_returns.get(asset_id, Decimal('0.0')) # Default to 0 if no return rate
-        
-        # New value after growth
-        value_after_growth = current_value_dec + growth_amount
-        value_i_pre_cashflow[asset_id] = value_after_growth
-        
-        # Add to total portfolio value
-        total_value_pre_cashflow += value_after_growth
+    if growth_factors is not None:
+        get_growth_factor = growth_factors.get # Bound once; called for every asset below
+        for asset_id, current_value in current_asset_values.items():
+            if type(current_value) is not Decimal:
+                current_value = Decimal(current_value)
+            # The factor defaults to 1 (no growth) if the asset has no return.
+            value_after_growth = current_value * get_growth_factor(asset_id, _ONE)
+            value_i_pre_cashflow[asset_id] = value_after_growth
+            total_value_pre_cashflow += value_after_growth
+    else:
+        get_monthly_return = monthly_asset_returns.get # Bound once; called for every asset below
+        for asset_id, current_value in current_asset_values.items():
+            # Ensure current_value is Decimal for precision. Values produced by earlier months
+            # are already Decimal, so skip the re-wrap in the common case.
+            if type(current_value) is not Decimal:
+                current_value = Decimal(current_value)
+            
+            # New value after growth. The return rate defaults to 0 if the asset has none.
+            value_after_growth = current_value + current_value * get_monthly_return(asset_id, _ZERO)
+            value_i_pre_cashflow[asset_id] = value_after_growth
+            
+            # Add to total portfolio value
+            total_value_pre_cashflow += value_after_growth
         
     logger.debug(f"Applied monthly growth. Total value before cash flow: {total_value_pre_cashflow:.2f}")
     return value_i_pre_cashflow, total_value_pre_cashflow
@@ -137,83 +172,106 @@ def _distribute_cash_flow(
     current_date: datetime.date, # For logging context
     value_i_pre_cashflow: Dict[int, Decimal], # Asset values after growth, before cash flow
     total_value_pre_cashflow: Decimal, # Total portfolio value after growth
-    net_change_month: Decimal # Net cash flow for the month
+    net_change_month: Decimal, # Net cash flow for the month
+    in_place: bool = False, # Reuse `value_i_pre_cashflow` as the result dict instead of allocating a new one
+    allocate_to_first_asset: bool = False # Fallback: put inflows into a zero-value portfolio in one asset
 ) -> Tuple[Dict[int, Decimal], Decimal]:
     """Distributes the net monthly cash flow proportionally across assets.
 
     If the portfolio has positive value before cash flow, the net change is distributed
     according to each asset's proportion of the total value.
-    If the portfolio value is zero or negative, special handling applies for positive cash inflows.
+    If the portfolio value is zero or negative, there are no proportions to follow: a positive
+    cash inflow is split evenly across the assets (or, with `allocate_to_first_asset`, given
+    entirely to the first asset), and a withdrawal only reduces the total.
 
     Args:
         current_date: The current month's date (for logging).
         value_i_pre_cashflow: Asset values after growth but before this month's cash flows.
         total_value_pre_cashflow: Total portfolio value corresponding to `value_i_pre_cashflow`.
         net_change_month: The net cash flow to be distributed this month.
+        in_place: If True, `value_i_pre_cashflow` is updated and returned as the result.
+                  Only safe when the caller owns that dict (e.g., `calculate_single_month`).
+        allocate_to_first_asset: If True, a positive inflow into a zero or negative value
+                                 portfolio goes entirely to the first asset instead of being
+                                 split evenly (the previous behaviour).
 
     Returns:
         A tuple containing:
             - value_i_final (Dict[int, Decimal]): Asset values after distributing cash flow.
             - current_total_value_month (Decimal): Final total portfolio value for the month.
     """
-    logger.debug(f"Distributing cash flow for {current_date.strftime('%Y-%m')}. "
-                 f"Value pre-cashflow: {json.dumps({k: str(v) for k, v in value_i_pre_cashflow.items()}) if value_i_pre_cashflow else 'None'}, "
-                 f"Total pre-cashflow: {total_value_pre_cashflow:.2f}, Net change: {net_change_month:.2f}")
-    value_i_final = {} # Stores final asset values after cash flow distribution
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Distributing cash flow for {current_date.strftime('%Y-%m')}. "
+                     f"Value pre-cashflow: {json.dumps({k: str(v) for k, v in value_i_pre_cashflow.items()}) if value_i_pre_cashflow else 'None'}, "
+                     f"Total pre-cashflow: {total_value_pre_cashflow:.2f}, Net change: {net_change_month:.2f}")
+    # No cash flow this month (the common case for months without planned changes): there is
+    # nothing to distribute, so skip the division and the pass over the assets.
+    if not net_change_month:
+        logger.debug(f"No net cash flow for {current_date.strftime('%Y-%m')}. Final total value: {total_value_pre_cashflow:.2f}")
+        return (value_i_pre_cashflow if in_place else value_i_pre_cashflow.copy()), total_value_pre_cashflow
+
+    # Stores final asset values after cash flow distribution
+    value_i_final = value_i_pre_cashflow if in_place else {}
     current_total_value_month = total_value_pre_cashflow # Initialize with pre-cashflow total
 
     # Distribute net cash flow based on whether the portfolio has a positive value.
-    if total_value_pre_cashflow > Decimal('0.0'):
+    if total_value_pre_cashflow > _ZERO:
         # Scenario 1: Portfolio has positive value.
         # Distribute the net monthly cash flow (positive or negative) proportionally
         # across assets based on their value relative to the total pre-cashflow value.
-        for asset_id, pre_cashflow_val in value_i_pre_cashflow.items():
-            try:
-                # Calculate this asset's share of the cash flow.
-                # If total_value_pre_cashflow is zero (e.g., all assets were zero),
-                # this proportion calculation would be division by zero, but the
-                # `if total_value_pre_cashflow > Decimal('0.0')` guard prevents this.
-                proportion = pre_cashflow_val / total_value_pre_cashflow
-                cash_flow_for_asset_i = net_change_month * proportion
-                final_value_for_asset_i = pre_cashflow_val + cash_flow_for_asset_i
-                value_i_final[asset_id] = final_value_for_asset_i
-            except InvalidOperation as e:
-                # This might happen if total_value_pre_cashflow became zero unexpectedly
-                # or if pre_cashflow_val is problematic.
-                logger.error(
-                    f"Invalid operation during cash flow distribution for AssetID '{asset_id}' "
-                    f"at {current_date.strftime('%Y-%m')}. Pre-cashflow value: {pre_cashflow_val}, "
-                    f"Total pre-cashflow: {total_value_pre_cashflow}. Error: {e}. "
-                    "Using pre-cashflow value for this asset."
-                )
-                value_i_final[asset_id] = pre_cashflow_val # Fallback to pre-cashflow value
-
-        # Recalculate total from individual final asset values for precision,
+        # Each asset receives `net_change * value / total`, which is the same as scaling every
+        # asset by a single factor `1 + net_change / total`. Computing that factor once turns
+        # three Decimal operations per asset into one multiplication.
+        try:
+            # The `total_value_pre_cashflow > 0` guard above prevents division by zero.
+            distribution_factor = _ONE + net_change_month / total_value_pre_cashflow
+        except InvalidOperation as e:
+            # This might happen if the total or the net change is not a finite Decimal.
+            logger.error(
+                f"Invalid operation during cash flow distribution at {current_date.strftime('%Y-%m')}. "
+                f"Total pre-cashflow: {total_value_pre_cashflow}, Net change: {net_change_month}. Error: {e}. "
+                "Using pre-cashflow values for all assets."
+            )
+            return (value_i_pre_cashflow if in_place else value_i_pre_cashflow.copy()), total_value_pre_cashflow
+
+        # Accumulate the total from the individual final asset values for precision,
         # as summing Decimal proportions can sometimes lead to tiny discrepancies.
-        current_total_value_month = sum(value_i_final.values())
+        # Overwriting values while iterating is safe because the set of keys does not change.
+        current_total_value_month = Decimal('0.0')
+        for asset_id, pre_cashflow_val in value_i_pre_cashflow.items():
+            final_value_for_asset_i = pre_cashflow_val * distribution_factor
+            value_i_final[asset_id] = final_value_for_asset_i
+            current_total_value_month += final_value_for_asset_i
     else:
         # Scenario 2: Portfolio value before cash flow is zero or negative.
         # In this case, proportional distribution based on asset values is not meaningful.
         # The net cash flow is applied directly to the total portfolio value.
         current_total_value_month = total_value_pre_cashflow + net_change_month
-        value_i_final = value_i_pre_cashflow.copy() # Asset values are typically zero or unchanged.
+        if not in_place:
+            value_i_final = value_i_pre_cashflow.copy() # Asset values are typically zero or unchanged.
         
         # Special handling for positive net cash inflow when starting from zero/negative value:
         # If there's a positive net cash inflow (e.g., a contribution) and assets are defined
         # (even if they all have zero value), a strategy is needed to allocate this inflow.
-        # The current simple strategy is to allocate the entire net positive cash flow
-        # to the "first" asset found in the `value_i_final` dictionary.
-        # This is a placeholder strategy and might need refinement based on more complex
-        # business rules, such as pre-defined target allocations for new cash.
+        # Without value-based proportions, every asset gets an equal share, which is what the
+        # proportional rule gives when all assets hold the same value. Pre-defined target
+        # allocations for new cash could replace the equal weights here.
         if net_change_month > Decimal('0.0') and len(value_i_final) > 0:
-            # Attempt to allocate the positive inflow to the first available asset.
-            first_asset_id = next(iter(value_i_final)) # Get the ID of an arbitrary asset
-            value_i_final[first_asset_id] = value_i_final.get(first_asset_id, Decimal('0.0')) + net_change_month
+            if allocate_to_first_asset:
+                # Fallback: allocate the entire positive inflow to the first available asset.
+                first_asset_id = next(iter(value_i_final)) # Get the ID of an arbitrary asset
+                value_i_final[first_asset_id] = value_i_final.get(first_asset_id, Decimal('0.0')) + net_change_month
+                allocation_note = f"to asset ID '{first_asset_id}'"
+            else:
+                equal_share = net_change_month / len(value_i_final)
+                for asset_id, pre_cashflow_val in value_i_final.items():
+                    value_i_final[asset_id] = pre_cashflow_val + equal_share
+                allocation_note = f"evenly across {len(value_i_final)} asset(s)"
             # Recalculate the total portfolio value as individual asset values have now changed.
             current_total_value_month = sum(value_i_final.values())
             logger.info(
                 f"Portfolio value at {current_date.strftime('%Y-%m')} was {total_value_pre_cashflow:.2f}. "
-                f"Positive net change {net_change_month:.2f} was allocated (e.g., to asset ID '{first_asset_id}'). "
+                f"Positive net change {net_change_month:.2f} was allocated {allocation_note}. "
                 f"New total: {current_total_value_month:.2f}"
             )
         elif net_change_month != Decimal('0.0'):
@@ -234,20 +292,28 @@ def calculate_single_month(
     current_date: datetime.date, # The date representing the current month of calculation
     current_asset_values: Dict[int, Decimal], # Asset values at the start of the month
     monthly_asset_returns: Dict[int, Decimal], # Expected return rates for each asset for this month
-    monthly_changes: List[PlannedFutureChange] # Cash flow changes occurring this month
+    monthly_changes: List[PlannedFutureChange], # Cash flow changes occurring this month
+    *,
+    growth_factors: Optional[Dict[int, Decimal]] = None # Precomputed `1 + return` per asset
 ) -> Tuple[Dict[int, Decimal], Decimal]:
     """Calculates the portfolio's asset values and total value for a single month.
 
     This function orchestrates the monthly calculation by:
-    1. Applying growth to current asset values based on their expected monthly returns.
-    2. Calculating the net cash flow from all planned changes occurring within the month.
+    1. Calculating the net cash flow from all planned changes occurring within the month.
+    2. Applying growth to current asset values based on their expected monthly returns.
     3. Distributing this net cash flow proportionally across the assets.
 
+    If there is no net cash flow and no asset grows this month, the asset values are
+    returned unchanged without running steps 2 and 3. When `growth_factors` is given, it is
+    what step 2 applies, so "no growth" is judged from the factors rather than the returns.
+
     Args:
         current_date: The date representing the month being calculated (e.g., first day of month).
         current_asset_values: Dictionary of asset IDs to their Decimal values at the month's start.
         monthly_asset_returns: Dictionary of asset IDs to their Decimal monthly return rates.
         monthly_changes: List of `PlannedFutureChange` objects for this month.
+        growth_factors: Optional output of `precompute_growth_factors(monthly_asset_returns)`,
+                        computed once per projection instead of once per month.
 
     Returns:
         A tuple containing:
@@ -255,30 +321,53 @@ def calculate_single_month(
             - current_total_value_month (Decimal): Total portfolio value at the end of the month.
     """
     logger.info(f"Calculating single month projection for: {current_date.strftime('%Y-%m')}")
-    logger.debug(f"Starting asset values: {json.dumps({k: str(v) for k,v in current_asset_values.items()}) if current_asset_values else 'None'}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Starting asset values: {json.dumps({k: str(v) for k,v in current_asset_values.items()}) if current_asset_values else 'None'}")
 
-    # Step 1: Apply expected monthly growth to assets.
+    # Step 1: Calculate the net cash flow for the month from planned changes.
+    # This sums up all contributions, withdrawals, dividends, etc. It does not depend on
+    # asset values, so it is done first to allow the no-op shortcut below.
+    net_change_month = _calculate_net_monthly_change(
+        monthly_changes # List of PlannedFutureChange objects for this month
+    )
+
+    # Shortcut: with no cash flow and every monthly return at zero (e.g., cash-like holdings in
+    # a month without scheduled changes), growth and distribution leave all values unchanged.
+    # Step 2 multiplies by `growth_factors` when given, so check those instead of the returns.
+    if growth_factors is not None:
+        no_growth = all(factor == _ONE for factor in growth_factors.values())
+    else:
+        no_growth = not any(monthly_asset_returns.values())
+    if net_change_month == _ZERO and no_growth:
+        value_i_final = {
+            asset_id: value if type(value) is Decimal else Decimal(value)
+            for asset_id, value in current_asset_values.items()
+        }
+        current_total_value_month = sum(value_i_final.values(), _ZERO)
+        logger.info(f"Finished calculation for {current_date.strftime('%Y-%m')} (no growth or cash flow). "
+                    f"Final total value: {current_total_value_month:.2f}")
+        return value_i_final, current_total_value_month
+
+    # Step 2: Apply expected monthly growth to assets.
     # This calculates `value_i_pre_cashflow` (individual asset values after growth)
     # and `total_value_pre_cashflow` (total portfolio value after growth).
     value_i_pre_cashflow, total_value_pre_cashflow = _apply_monthly_growth(
-        current_asset_values, monthly_asset_returns
-    )
-
-    # Step 2: Calculate the net cash flow for the month from planned changes.
-    # This sums up all contributions, withdrawals, dividends, etc.
-    net_change_month = _calculate_net_monthly_change(
-        monthly_changes # List of PlannedFutureChange objects for this month
+        current_asset_values, monthly_asset_returns, growth_factors
     )
 
     # Step 3: Distribute the net cash flow across assets and finalize monthly values.
     # This adjusts `value_i_pre_cashflow` based on `net_change_month` to get `value_i_final`.
+    # The grown-values dict was created by step 2 and is not visible to the caller, so it is
+    # updated in place: one dict allocation per month instead of two.
     value_i_final, current_total_value_month = _distribute_cash_flow(
         current_date, # Pass current_date for logging context within _distribute_cash_flow
         value_i_pre_cashflow,
         total_value_pre_cashflow,
-        net_change_month
+        net_change_month,
+        in_place=True
     )
     
     logger.info(f"Finished calculation for {current_date.strftime('%Y-%m')}. Final total value: {current_total_value_month:.2f}")
-    logger.debug(f"Ending asset values: {json.dumps({k: str(v) for k,v in value_i_final.items()}) if value_i_final else 'None'}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Ending asset values: {json.dumps({k: str(v) for k,v in value_i_final.items()}) if value_i_final else 'None'}")
     return value_i_final, current_total_value_month 
\ No newline at end of file
@@ -33,9 +33,9 @@ from app.enums import ChangeType, EndsOnType
 from app.schemas.portfolio_schemas import PlannedChangeCreateSchema
 
 # Import the new recurrence service
-from .recurrence_service import get_occurrences_for_month
+from .recurrence_service import get_occurrences_for_range
 # Import the new monthly calculator service
-from .monthly_calculator import calculate_single_month
+from .monthly_calculator import calculate_single_month, precompute_growth_factors
 # Import the new projection initializer service
 from .projection_initializer import initialize_projection
 
@@ -160,12 +160,28 @@ def calculate_projection(
     # The key is the rule's ID (or temporary ID for drafts).
     rule_generated_counts: Dict[any, int] = {} 
 
+    # Whether a rule is capped by "ends after X occurrences" does not change from month to
+    # month, so resolve each rule's key and cap once here rather than inside the monthly loop.
+    # The cap is None for one-time changes and for recurring rules without an occurrence limit.
+    rules_with_occurrence_limits: List[Tuple[PlannedFutureChange, any, Optional[int]]] = []
+    for rule in effective_planned_changes:
+        occurrence_limit = None
+        if (rule.is_recurring and 
+            rule.ends_on_type == EndsOnType.AFTER_OCCURRENCES and 
+            rule.ends_on_occurrences is not None and 
+            rule.ends_on_occurrences > 0):
+            occurrence_limit = rule.ends_on_occurrences
+        # Use the rule's persistent ID or the temporary ID assigned to drafts for tracking.
+        rules_with_occurrence_limits.append((rule, rule.change_id, occurrence_limit))
+
     # --- 4. Initialize Projection State (Asset Values, Returns, Total Value) ---
     # This uses the `projection_initializer` service.
     current_asset_values, monthly_asset_returns, current_total_value = \
         initialize_projection(assets, initial_total_value)
     logger.info(f"Projection initialized. Start Date: {start_date}, Initial Total Value: {current_total_value:.2f}. "
                 f"Initial Asset Values: {current_asset_values}, Monthly Asset Returns: {monthly_asset_returns}")
+    # Monthly returns are constant for the whole projection, so `1 + return` is computed once here.
+    monthly_growth_factors = precompute_growth_factors(monthly_asset_returns)
 
     # `projection_results` will store (date, total_value) tuples for each month-end.
     # Start with the initial state.
@@ -178,32 +194,40 @@ def calculate_projection(
     loop_end_date = end_date.replace(day=1) + relativedelta(months=1) 
     logger.debug(f"Monthly projection loop starting. Current Date: {current_date}, Loop End Date: {loop_end_date}")
 
+    # Expand every rule over all calendar months the loop touches in one pass, instead of
+    # re-walking each rule's recurrence from its start date once per projected month.
+    occurrences_range_start = start_date.replace(day=1)
+    occurrences_range_end = loop_end_date - relativedelta(days=1)
+    rule_occurrences_with_limits = [
+        (get_occurrences_for_range(rule, occurrences_range_start, occurrences_range_end), rule_key, occurrence_limit)
+        for rule, rule_key, occurrence_limit in rules_with_occurrence_limits
+    ]
+    # The per-month debug messages below format every asset's value and return, which costs
+    # O(number of assets) work per month even when DEBUG is off. Check the level once up front.
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+
     while current_date < loop_end_date:
         # Determine the actual end date for the current month's calculation.
         # It's either the natural month-end or the projection `end_date` if it's earlier.
         month_end_date = current_date + relativedelta(months=1) - relativedelta(days=1)
         actual_month_end_for_reporting = min(month_end_date, end_date)
-        logger.debug(f"Processing month starting {current_date.strftime('%Y-%m-%d')}, reporting at {actual_month_end_for_reporting.strftime('%Y-%m-%d')}. "
-                     f"Current Asset Values: {current_asset_values}, Monthly Asset Returns: {monthly_asset_returns}")
+        if debug_enabled:
+            logger.debug(f"Processing month starting {current_date.strftime('%Y-%m-%d')}, reporting at {actual_month_end_for_reporting.strftime('%Y-%m-%d')}. "
+                         f"Current Asset Values: {current_asset_values}, Monthly Asset Returns: {monthly_asset_returns}")
 
-        # --- Generate Occurrences of Planned Changes for the Current Month ---
-        # This is done "on-the-fly" for each month to handle complex recurrence rules correctly.
+        # --- Collect Occurrences of Planned Changes for the Current Month ---
+        # Occurrences were generated once per rule for the whole projection before the loop;
+        # the "ends after X occurrences" limits are still applied month by month here.
         actual_changes_for_this_month: List[PlannedFutureChange] = []
-        for rule in effective_planned_changes:
-            # Use the rule's persistent ID or the temporary ID assigned to drafts for tracking.
-            rule_key = rule.change_id # Assumes change_id is now reliably set for drafts too.
-            
+        month_key = (current_date.year, current_date.month)
+        for rule_occurrences_by_month, rule_key, occurrence_limit in rule_occurrences_with_limits:
             # Get all potential occurrences of this rule within the current month.
-            candidate_occurrences = get_occurrences_for_month(rule, current_date.year, current_date.month)
+            candidate_occurrences = rule_occurrences_by_month.get(month_key, [])
             
             # If the rule is recurring and has an "ends after X occurrences" condition:
-            if (rule.is_recurring and 
-                rule.ends_on_type == EndsOnType.AFTER_OCCURRENCES and 
-                rule.ends_on_occurrences is not None and 
-                rule.ends_on_occurrences > 0):
-                
+            if occurrence_limit is not None:
                 already_generated_count = rule_generated_counts.get(rule_key, 0)
-                occurrences_still_needed = rule.ends_on_occurrences - already_generated_count
+                occurrences_still_needed = occurrence_limit - already_generated_count
                 
                 if occurrences_still_needed > 0:
                     # Add only the needed number of occurrences from the candidates.
@@ -213,15 +237,17 @@ def calculate_projection(
             else:
                 # For non-limited recurring rules or one-time changes.
                 actual_changes_for_this_month.extend(candidate_occurrences)
-        logger.debug(f"Generated {len(actual_changes_for_this_month)} change events for month {current_date.strftime('%Y-%m')}.")
-        # --- End of On-the-Fly Change Generation ---
+        if debug_enabled:
+            logger.debug(f"Generated {len(actual_changes_for_this_month)} change events for month {current_date.strftime('%Y-%m')}.")
+        # --- End of Change Collection ---
 
         # Calculate asset values and total value for the end of this month.
         next_asset_values, next_total_value = calculate_single_month(
             current_date, # Represents the start of the month being calculated
             current_asset_values,
             monthly_asset_returns,
-            actual_changes_for_this_month # List of specific change events for this month
+            actual_changes_for_this_month, # List of specific change events for this month
+            growth_factors=monthly_growth_factors
         )
 
         # Update current state for the next iteration.
@@ -230,7 +256,8 @@ def calculate_projection(
         
         # Store the result for this month-end.
         projection_results.append((actual_month_end_for_reporting, current_total_value))
-        logger.debug(f"End of month {current_date.strftime('%Y-%m')}: Total Value = {current_total_value:.2f}")
+        if debug_enabled:
+            logger.debug(f"End of month {current_date.strftime('%Y-%m')}: Total Value = {current_total_value:.2f}")
 
         # Move to the first day of the next month.
         current_date += relativedelta(months=1)
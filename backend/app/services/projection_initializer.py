@@ -193,7 +193,9 @@ def _calculate_all_monthly_asset_returns(assets: List[Asset]) -> Dict[int, Decim
 
 def initialize_projection(
     assets: List[Asset], 
-    initial_total_value_override: Optional[Decimal]
+    initial_total_value_override: Optional[Decimal],
+    *,
+    monthly_returns: Optional[Dict[int, Decimal]] = None
 ) -> Tuple[Dict[int, Decimal], Dict[int, Decimal], Decimal]:
     """Initializes and returns the core components for starting a portfolio projection.
 
@@ -209,6 +211,10 @@ def initialize_projection(
                                       allocations as the projection's starting total value.
                                       It also influences how percentage-based asset
                                       allocations are initialized.
+        monthly_returns: Optional precomputed monthly return rates keyed by asset ID.
+                         When provided, they are used as-is and the per-asset return
+                         strategies are not evaluated again (e.g. when the same
+                         portfolio is projected repeatedly).
     Returns:
         A tuple containing:
             - current_asset_values (Dict[int, Decimal]): Initial values for each asset.
@@ -226,8 +232,12 @@ def initialize_projection(
         assets, initial_total_value_override
     )
 
-    # 2. Calculate expected monthly (decimal) returns for each asset based on their type and data.
-    monthly_asset_returns = _calculate_all_monthly_asset_returns(assets)
+    # 2. Calculate expected monthly (decimal) returns for each asset based on their type and data,
+    #    unless the caller already has them.
+    if monthly_returns is not None:
+        monthly_asset_returns = monthly_returns
+    else:
+        monthly_asset_returns = _calculate_all_monthly_asset_returns(assets)
 
     # 3. Determine the definitive starting total value for the projection.
     # This value will be used as the baseline for the first month of the projection.
@@ -10,15 +10,19 @@ This module provides functionality to:
 - Create new, non-recurring `PlannedFutureChange` instances for each generated
   occurrence, which can then be used by projection or calculation engines.
 
-The main entry point for generating monthly occurrences is `get_occurrences_for_month`.
+The main entry point for generating monthly occurrences is `get_occurrences_for_month`;
+`get_occurrences_for_range` generates a whole period at once, grouped by month.
 A deprecated function `_expand_single_recurring_change` is kept for reference
 as it contains similar rrule parameter construction logic, though it was designed
 to expand occurrences over an entire projection period rather than month by month.
 """
+import calendar
 import datetime
+import functools
+from collections import defaultdict
 from dateutil import rrule # For recurrence rule processing
 import logging
-from typing import List, Dict, Callable, Optional # Using Optional from typing
+from typing import Any, List, Dict, Callable, NamedTuple, Optional, Tuple # Using Optional from typing
 
 # Import ORM model and Enums from the application
 from app.models import PlannedFutureChange
@@ -30,6 +34,13 @@ logger = logging.getLogger(__name__)
 # Helper constant mapping integer day indices (0=Mon, 6=Sun) to rrule weekday constants.
 _RRULE_DAYS_MAP = [rrule.MO, rrule.TU, rrule.WE, rrule.TH, rrule.FR, rrule.SA, rrule.SU]
 
+# `bysetpos` defines the Nth occurrence (1st, 2nd, ..., last which is -1).
+_MONTH_ORDINAL_TO_BYSETPOS = {
+    MonthOrdinalType.FIRST: 1, MonthOrdinalType.SECOND: 2,
+    MonthOrdinalType.THIRD: 3, MonthOrdinalType.FOURTH: 4,
+    MonthOrdinalType.LAST: -1  # Last occurrence of the weekday in the month
+}
+
 def _map_days_of_week_to_rrule(days_of_week_indices: Optional[List[int]]) -> Optional[List[rrule.weekday]]:
     """Maps a list of day-of-week integer indices to rrule weekday constants.
     
@@ -91,12 +102,6 @@ def _apply_monthly_rrule_params(change: PlannedFutureChange, rrule_params: dict)
     if change.day_of_month: # e.g., recur on the 15th day of the month
         rrule_params['bymonthday'] = change.day_of_month
     elif change.month_ordinal and change.month_ordinal_day: # e.g., recur on the 'first' 'Monday'
-        # `bysetpos` defines the Nth occurrence (1st, 2nd, ..., last which is -1).
-        month_ordinal_to_bysetpos = {
-            MonthOrdinalType.FIRST: 1, MonthOrdinalType.SECOND: 2,
-            MonthOrdinalType.THIRD: 3, MonthOrdinalType.FOURTH: 4,
-            MonthOrdinalType.LAST: -1  # Last occurrence of the weekday in the month
-        }
         # If the rule is for "Nth day" (e.g. "last day of month"), it's a direct bymonthday.
         if change.month_ordinal_day == OrdinalDayType.DAY:
             if change.month_ordinal == MonthOrdinalType.LAST:
@@ -107,9 +112,9 @@ def _apply_monthly_rrule_params(change: PlannedFutureChange, rrule_params: dict)
             # but typically `day_of_month` field would be used for specific day numbers.
         else: # Rule is for "Nth weekday/weekend_day/etc."
             mapped_ordinal_weekdays = _map_ordinal_day_to_rrule_weekdays(change.month_ordinal_day)
-            if mapped_ordinal_weekdays and change.month_ordinal in month_ordinal_to_bysetpos:
+            if mapped_ordinal_weekdays and change.month_ordinal in _MONTH_ORDINAL_TO_BYSETPOS:
                 rrule_params['byweekday'] = mapped_ordinal_weekdays
-                rrule_params['bysetpos'] = month_ordinal_to_bysetpos[change.month_ordinal]
+                rrule_params['bysetpos'] = _MONTH_ORDINAL_TO_BYSETPOS[change.month_ordinal]
 
 def _apply_yearly_rrule_params(change: PlannedFutureChange, rrule_params: dict) -> None:
     """Applies rrule parameters specific to YEARLY frequency.
@@ -124,11 +129,6 @@ def _apply_yearly_rrule_params(change: PlannedFutureChange, rrule_params: dict)
     if change.day_of_month: # Specific day number in the month (e.g., 15th of June)
         rrule_params['bymonthday'] = change.day_of_month
     elif change.month_ordinal and change.month_ordinal_day: # Ordinal day in the month (e.g., last Monday of June)
-        month_ordinal_to_bysetpos = {
-            MonthOrdinalType.FIRST: 1, MonthOrdinalType.SECOND: 2,
-            MonthOrdinalType.THIRD: 3, MonthOrdinalType.FOURTH: 4,
-            MonthOrdinalType.LAST: -1
-        }
         if change.month_ordinal_day == OrdinalDayType.DAY: # "Nth day of the month"
             if change.month_ordinal == MonthOrdinalType.LAST:
                 rrule_params['bymonthday'] = -1 # Last day of the specified month
@@ -136,9 +136,15 @@ def _apply_yearly_rrule_params(change: PlannedFutureChange, rrule_params: dict)
                 rrule_params['bymonthday'] = 1 # First day of the specified month
         else: # "Nth weekday/etc. of the month"
             mapped_ordinal_weekdays = _map_ordinal_day_to_rrule_weekdays(change.month_ordinal_day)
-            if mapped_ordinal_weekdays and change.month_ordinal in month_ordinal_to_bysetpos:
+            if mapped_ordinal_weekdays and change.month_ordinal in _MONTH_ORDINAL_TO_BYSETPOS:
                 rrule_params['byweekday'] = mapped_ordinal_weekdays
-                rrule_params['bysetpos'] = month_ordinal_to_bysetpos[change.month_ordinal]
+                rrule_params['bysetpos'] = _MONTH_ORDINAL_TO_BYSETPOS[change.month_ordinal]
+
+    # dateutil only infers `bymonth` from `dtstart` when `bymonthday` is unset. Without it, a
+    # YEARLY rule with a day number matches that day in every month of the year, so pin the
+    # month to the rule's month (or its start month) whenever a day number is given.
+    if 'bymonthday' in rrule_params and 'bymonth' not in rrule_params:
+        rrule_params['bymonth'] = rrule_params['dtstart'].month
 
 # --- Frequency Configuration Mapping ---
 # Type alias for the parameter applicator functions defined above.
@@ -164,39 +170,35 @@ FREQUENCY_CONFIG: Dict[FrequencyType, Dict[str, Optional[ParamApplier] | int]] =
     },
 }
 
-def _create_one_time_change_from_rule(
-    original_change_rule: PlannedFutureChange, 
-    occurrence_date: datetime.date,
+def _one_time_change_fields(
+    original_change_rule: PlannedFutureChange,
     description_suffix: str = " (Recurring Instance)" # Default suffix for description
-) -> PlannedFutureChange:
-    """Creates a new, non-recurring PlannedFutureChange instance from an original rule for a specific occurrence date.
+) -> Dict[str, Any]:
+    """Builds the constructor arguments shared by every one-time instance of a rule.
 
-    The new instance represents a single event generated by the recurring rule.
-    It's marked as non-recurring (is_recurring=False, frequency=ONE_TIME) and
-    inherits core properties like amount, type, and JSON data from the original rule.
-    Recurrence-specific fields from the original rule are reset or nulled out.
+    Everything except `change_date` is identical for all occurrences of a rule, so callers
+    generating many occurrences build this once and pass it to `_create_one_time_change_from_rule`.
+    All values are immutable, so the same dict can back any number of instances.
 
     Args:
         original_change_rule: The original PlannedFutureChange object that defines the recurrence.
-        occurrence_date: The specific date this new instance occurs on.
         description_suffix: A suffix to append to the original description, indicating
                             it's a generated instance.
 
     Returns:
-        A new PlannedFutureChange object representing a single occurrence.
+        A dict of PlannedFutureChange keyword arguments, without `change_date`.
     """
-    logger.debug(f"Creating one-time change from rule ID '{original_change_rule.change_id}' for date {occurrence_date}. "
+    logger.debug(f"Preparing one-time changes from rule ID '{original_change_rule.change_id}'. "
                  f"Original rule details: Type={original_change_rule.change_type}, Amount={original_change_rule.amount}")
     new_description = original_change_rule.description if original_change_rule.description else ""
     if description_suffix and new_description: # Add space if both exist
         new_description += description_suffix
     elif description_suffix: # Only suffix exists
         new_description = description_suffix.strip()
-        
-    return PlannedFutureChange(
+
+    return dict(
         portfolio_id=original_change_rule.portfolio_id,
         change_type=original_change_rule.change_type,
-        change_date=occurrence_date, # Key: this instance occurs on this specific date
         amount=original_change_rule.amount,
         target_allocation_json=original_change_rule.target_allocation_json,
         description=new_description,
@@ -216,160 +218,467 @@ def _create_one_time_change_from_rule(
         # Could add a field like `original_rule_id = original_change_rule.change_id` for traceability if needed.
     )
 
-def get_occurrences_for_month(
-    change_rule: PlannedFutureChange, 
-    target_year: int, 
-    target_month: int
-) -> List[PlannedFutureChange]:
-    """Generates all occurrences for a given `PlannedFutureChange` rule that fall
-    within the specified `target_year` and `target_month`.
+def _create_one_time_change_from_rule(
+    original_change_rule: PlannedFutureChange, 
+    occurrence_date: datetime.date,
+    description_suffix: str = " (Recurring Instance)", # Default suffix for description
+    *,
+    template_fields: Optional[Dict[str, Any]] = None
+) -> PlannedFutureChange:
+    """Creates a new, non-recurring PlannedFutureChange instance from an original rule for a specific occurrence date.
 
-    This function constructs an `rrule` based on the `change_rule`'s properties
-    (frequency, interval, specific day/date conditions, end conditions). It then
-    queries this `rrule` for occurrences within the boundaries of the target month.
-    Each found occurrence date results in a new, non-recurring `PlannedFutureChange`
-    instance created by `_create_one_time_change_from_rule`.
+    The new instance represents a single event generated by the recurring rule.
+    It's marked as non-recurring (is_recurring=False, frequency=ONE_TIME) and
+    inherits core properties like amount, type, and JSON data from the original rule.
+    Recurrence-specific fields from the original rule are reset or nulled out.
 
-    The function respects the rule's own end conditions (e.g., `ends_on_date`,
-    `ends_on_occurrences`). However, for rules with `ends_on_occurrences`, the
-    calling context (e.g., projection engine) is responsible for managing the
-    cumulative count of generated occurrences if the rule spans multiple months
-    to ensure the total limit is not exceeded across the entire projection. This
-    function itself will generate all occurrences within the month that would be
-    valid if the 'count' limit were applied to the rrule directly from its start.
+    Args:
+        original_change_rule: The original PlannedFutureChange object that defines the recurrence.
+        occurrence_date: The specific date this new instance occurs on.
+        description_suffix: A suffix to append to the original description, indicating
+                            it's a generated instance.
+        template_fields: Optional result of `_one_time_change_fields` for this rule. When
+                         provided, the shared fields are not rebuilt for this occurrence
+                         (and `description_suffix` is ignored).
+
+    Returns:
+        A new PlannedFutureChange object representing a single occurrence.
+    """
+    if template_fields is None:
+        template_fields = _one_time_change_fields(original_change_rule, description_suffix)
+    # Key: this instance occurs on this specific date.
+    return PlannedFutureChange(change_date=occurrence_date, **template_fields)
+
+def _rrule_until(ends_on_type: Optional[EndsOnType], ends_on_date: Optional[datetime.date]) -> Optional[datetime.datetime]:
+    """Returns the latest datetime an occurrence can happen based on a rule's `ends_on_date`.
+
+    The rule's end date is converted to a datetime at the maximum time of day so the
+    whole end day is inclusive. Returns None if the rule does not end on a date.
+    """
+    if ends_on_type != EndsOnType.ON_DATE or not ends_on_date:
+        return None
+    if isinstance(ends_on_date, datetime.date) and not isinstance(ends_on_date, datetime.datetime):
+        return datetime.datetime.combine(ends_on_date, datetime.datetime.max.time())
+    return ends_on_date
+
+
+class _RuleSignature(NamedTuple):
+    """Hashable snapshot of the fields of a `PlannedFutureChange` that define its rrule.
+
+    Field names match the `PlannedFutureChange` attributes, so the frequency-specific
+    parameter applicators above can be called with a signature in place of the rule.
+    """
+    frequency: FrequencyType
+    interval: int
+    dtstart: datetime.datetime
+    days_of_week: Optional[Tuple[int, ...]]
+    day_of_month: Optional[int]
+    month_ordinal: Optional[MonthOrdinalType]
+    month_ordinal_day: Optional[OrdinalDayType]
+    month_of_year: Optional[int]
+    ends_on_type: Optional[EndsOnType]
+    ends_on_date: Optional[datetime.date]
+    ends_on_occurrences: Optional[int]
+
+
+def _rule_signature(change_rule: PlannedFutureChange) -> _RuleSignature:
+    """Builds the `_RuleSignature` cache key for a recurring `PlannedFutureChange`."""
+    # `dtstart` for rrule must be a datetime object.
+    dtstart_datetime = change_rule.change_date
+    if isinstance(dtstart_datetime, datetime.date) and not isinstance(dtstart_datetime, datetime.datetime):
+        dtstart_datetime = datetime.datetime.combine(dtstart_datetime, datetime.datetime.min.time())
+    days_of_week = change_rule.days_of_week
+    return _RuleSignature(
+        frequency=change_rule.frequency,
+        interval=change_rule.interval if change_rule.interval and change_rule.interval > 0 else 1,
+        dtstart=dtstart_datetime,
+        days_of_week=tuple(days_of_week) if days_of_week is not None else None, # Lists are not hashable
+        day_of_month=change_rule.day_of_month,
+        month_ordinal=change_rule.month_ordinal,
+        month_ordinal_day=change_rule.month_ordinal_day,
+        month_of_year=change_rule.month_of_year,
+        ends_on_type=change_rule.ends_on_type,
+        ends_on_date=change_rule.ends_on_date,
+        ends_on_occurrences=change_rule.ends_on_occurrences,
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def _build_rrule(signature: _RuleSignature) -> rrule.rrule:
+    """Compiles the `rrule` for a recurrence signature.
+
+    Cached because the projection engine asks for the same rule's occurrences once per
+    projected month; the signature covers every field that influences the rrule, so an
+    edited rule produces a new key rather than a stale hit. `dateutil` rrules without
+    their own result cache are stateless when iterated, so sharing instances is safe.
+    Use `clear_recurrence_cache()` to drop all compiled rules.
+    """
+    frequency_details = FREQUENCY_CONFIG[signature.frequency]
+    rrule_params: Dict[str, Any] = {
+        'freq': frequency_details["rrule_const"], # e.g., rrule.MONTHLY
+        'dtstart': signature.dtstart,
+        'interval': signature.interval,
+        # If None (rule ends 'NEVER' or 'AFTER_OCCURRENCES'), rrule generates indefinitely or up to
+        # 'count'. Callers filter by their month window.
+        'until': _rrule_until(signature.ends_on_type, signature.ends_on_date),
+    }
+    if signature.ends_on_type == EndsOnType.AFTER_OCCURRENCES:
+        rrule_params['count'] = signature.ends_on_occurrences
+
+    # Apply frequency-specific rrule parameters (e.g., byweekday, bymonthday).
+    param_func = frequency_details.get("param_func")
+    if param_func: # If a specific applicator function exists for this frequency
+        param_func(signature, rrule_params) # Modifies rrule_params in-place
+
+    logger.debug(f"Compiled rrule for signature {signature}: {rrule_params}")
+    return rrule.rrule(**rrule_params)
+
+
+def clear_recurrence_cache() -> None:
+    """Clears the compiled rrule cache used by `get_occurrences_for_month`."""
+    _build_rrule.cache_clear()
+
+def _daily_occurrence_dates(
+    change_rule: PlannedFutureChange,
+    rule_start_date: datetime.date,
+    range_start: datetime.date,
+    range_end: datetime.date
+) -> List[datetime.date]:
+    """Returns the dates of a DAILY rule's occurrences between two dates (inclusive).
+
+    Equivalent to walking `rrule(DAILY, dtstart, interval, until, count)` but computed
+    directly: the k-th occurrence (counting from 0) falls `k * interval` days after the
+    rule's start date, so the occurrences inside the range are a slice of that sequence.
+    """
+    interval = change_rule.interval if change_rule.interval and change_rule.interval > 0 else 1
+    start_ordinal = rule_start_date.toordinal()
+
+    # Last ordinal allowed by the range and by the rule's own end date.
+    last_ordinal = range_end.toordinal()
+    until = _rrule_until(change_rule.ends_on_type, change_rule.ends_on_date)
+    if until is not None:
+        last_ordinal = min(last_ordinal, until.toordinal())
+
+    # Index of the first occurrence on or after the range start (ceiling division).
+    first_index = max(0, -(-(range_start.toordinal() - start_ordinal) // interval))
+    # Index just past the last occurrence on or before `last_ordinal`.
+    end_index = (last_ordinal - start_ordinal) // interval + 1
+    if change_rule.ends_on_type == EndsOnType.AFTER_OCCURRENCES:
+        end_index = min(end_index, change_rule.ends_on_occurrences)
+
+    return [datetime.date.fromordinal(start_ordinal + index * interval) for index in range(first_index, end_index)]
+
+def _weekly_occurrence_dates(
+    change_rule: PlannedFutureChange,
+    rule_start_date: datetime.date,
+    range_start: datetime.date,
+    range_end: datetime.date
+) -> List[datetime.date]:
+    """Returns the dates of a WEEKLY rule's occurrences between two dates (inclusive).
+
+    Equivalent to walking `rrule(WEEKLY, dtstart, interval, byweekday, until)`: an
+    occurrence falls on each listed weekday of every `interval`-th week, counting weeks
+    (which begin on `calendar.firstweekday()`, as in rrule) from the week of the start
+    date, and never before the start date itself. Occurrence counts are not handled here.
+    """
+    interval = change_rule.interval if change_rule.interval and change_rule.interval > 0 else 1
+    step = 7 * interval
+    # Same filtering as `_map_days_of_week_to_rrule`; without valid days rrule uses the start date's weekday.
+    weekdays = {i for i in (change_rule.days_of_week or []) if 0 <= i <= 6} or {rule_start_date.weekday()}
+
+    first_ordinal = max(range_start, rule_start_date).toordinal()
+    last_ordinal = range_end.toordinal()
+    until = _rrule_until(change_rule.ends_on_type, change_rule.ends_on_date)
+    if until is not None:
+        last_ordinal = min(last_ordinal, until.toordinal())
+
+    week_start = calendar.firstweekday()
+    start_week_ordinal = rule_start_date.toordinal() - (rule_start_date.weekday() - week_start) % 7
+    occurrence_ordinals: List[int] = []
+    for weekday in weekdays:
+        # First date on or after `first_ordinal` falling on this weekday ...
+        ordinal = first_ordinal + (weekday - datetime.date.fromordinal(first_ordinal).weekday()) % 7
+        # ... moved forward into the next week that is in phase with the rule's interval.
+        weeks_into_cycle = (ordinal - start_week_ordinal) % step // 7
+        if weeks_into_cycle:
+            ordinal += 7 * (interval - weeks_into_cycle)
+        occurrence_ordinals.extend(range(ordinal, last_ordinal + 1, step))
+
+    return [datetime.date.fromordinal(ordinal) for ordinal in sorted(occurrence_ordinals)]
+
+def _nth_weekday_of_month(year: int, month: int, weekday: int, ordinal: int) -> Optional[datetime.date]:
+    """Returns the `ordinal`-th (1-based) given weekday (0=Mon) of a month, or None if it doesn't exist."""
+    first_weekday, days_in_month = calendar.monthrange(year, month)
+    day = 1 + (weekday - first_weekday) % 7 + 7 * (ordinal - 1)
+    return datetime.date(year, month, day) if day <= days_in_month else None
+
+def _last_weekday_of_month(year: int, month: int, weekday: int) -> datetime.date:
+    """Returns the last given weekday (0=Mon) of a month."""
+    month_end = datetime.date(year, month, calendar.monthrange(year, month)[1])
+    return month_end - datetime.timedelta(days=(month_end.weekday() - weekday) % 7)
+
+def _ordinal_day_of_month(year: int, month: int, weekdays: List[int], position: int) -> Optional[datetime.date]:
+    """Returns the `position`-th day of a month falling on one of `weekdays`, as rrule's
+    `byweekday` + `bysetpos` would (position -1 is the last such day).
+
+    Returns None if the month has fewer matching days than requested.
+    """
+    if len(weekdays) == 1: # e.g., "first Monday", "last Friday"
+        if position == -1:
+            return _last_weekday_of_month(year, month, weekdays[0])
+        return _nth_weekday_of_month(year, month, weekdays[0], position)
+    # Several weekdays (e.g., "last weekday" = Mon-Fri): step through the month from the
+    # relevant end. At most a couple of weeks are visited.
+    days_in_month = calendar.monthrange(year, month)[1]
+    days = range(days_in_month, 0, -1) if position == -1 else range(1, days_in_month + 1)
+    remaining = abs(position)
+    for day in days:
+        candidate = datetime.date(year, month, day)
+        if candidate.weekday() in weekdays:
+            remaining -= 1
+            if remaining == 0:
+                return candidate
+    return None
+
+def _monthly_ordinal_occurrence_dates(
+    change_rule: PlannedFutureChange,
+    rule_start_date: datetime.date,
+    range_start: datetime.date,
+    range_end: datetime.date
+) -> List[datetime.date]:
+    """Returns the dates of a MONTHLY "Nth <weekday> of the month" rule between two dates (inclusive).
+
+    Equivalent to walking `rrule(MONTHLY, dtstart, interval, byweekday, bysetpos, until)`:
+    one date per `interval`-th month counted from the start month, never before the
+    start date itself. Occurrence counts are not handled here.
+    """
+    interval = change_rule.interval if change_rule.interval and change_rule.interval > 0 else 1
+    weekdays = [day.weekday for day in _map_ordinal_day_to_rrule_weekdays(change_rule.month_ordinal_day)]
+    position = _MONTH_ORDINAL_TO_BYSETPOS[change_rule.month_ordinal]
+
+    first_date = max(range_start, rule_start_date)
+    last_date = range_end
+    until = _rrule_until(change_rule.ends_on_type, change_rule.ends_on_date)
+    if until is not None:
+        last_date = min(last_date, until.date())
+
+    # Months are indexed as year * 12 + (month - 1); start at the first month in phase with the interval.
+    start_month_index = rule_start_date.year * 12 + rule_start_date.month - 1
+    month_index = first_date.year * 12 + first_date.month - 1
+    month_index += -(month_index - start_month_index) % interval
+    last_month_index = last_date.year * 12 + last_date.month - 1
+
+    occurrence_dates: List[datetime.date] = []
+    for index in range(month_index, last_month_index + 1, interval):
+        occurrence_date = _ordinal_day_of_month(index // 12, index % 12 + 1, weekdays, position)
+        if occurrence_date is not None and first_date <= occurrence_date <= last_date:
+            occurrence_dates.append(occurrence_date)
+    return occurrence_dates
+
+def _arithmetic_occurrence_dates(
+    change_rule: PlannedFutureChange,
+    rule_start_date: datetime.date,
+    range_start: datetime.date,
+    range_end: datetime.date
+) -> Optional[List[datetime.date]]:
+    """Computes a rule's occurrence dates in a range without an rrule, when its shape allows.
+
+    Returns None for rules that need the general rrule expansion.
+    """
+    if change_rule.frequency == FrequencyType.DAILY:
+        # DAILY rules take no BY* parameters, so their dates are plain arithmetic from the start date.
+        return _daily_occurrence_dates(change_rule, rule_start_date, range_start, range_end)
+    # An occurrence count is applied from the rule's start, so counted rules go through rrule.
+    if change_rule.ends_on_type == EndsOnType.AFTER_OCCURRENCES:
+        return None
+    if change_rule.frequency == FrequencyType.WEEKLY:
+        return _weekly_occurrence_dates(change_rule, rule_start_date, range_start, range_end)
+    if (change_rule.frequency == FrequencyType.MONTHLY and not change_rule.day_of_month
+            and change_rule.month_ordinal in _MONTH_ORDINAL_TO_BYSETPOS
+            and change_rule.month_ordinal_day is not None
+            and _map_ordinal_day_to_rrule_weekdays(change_rule.month_ordinal_day)):
+        # Same conditions under which `_apply_monthly_rrule_params` uses byweekday + bysetpos.
+        return _monthly_ordinal_occurrence_dates(change_rule, rule_start_date, range_start, range_end)
+    return None
+
+def get_occurrences_for_range(
+    change_rule: PlannedFutureChange,
+    range_start: datetime.date,
+    range_end: datetime.date,
+    *,
+    cache: bool = True
+) -> Dict[Tuple[int, int], List[PlannedFutureChange]]:
+    """Generates all occurrences of a `PlannedFutureChange` rule between two dates,
+    grouped by calendar month.
+
+    This lets a caller sweeping many months (e.g., the projection engine) walk the
+    rule's `rrule` once for the whole period instead of once per month. The `rrule`
+    keeps the rule's own `change_date` as `dtstart`, so `interval` alignment and
+    `ends_on_occurrences` counting behave exactly as for a single month.
+
+    See `get_occurrences_for_month` for how end conditions and cumulative
+    occurrence counts are handled.
 
     Args:
         change_rule: The `PlannedFutureChange` ORM object defining the recurrence.
-        target_year: The year of the target month.
-        target_month: The month number (1-12) of the target month.
+        range_start: The first date (inclusive) to generate occurrences for.
+        range_end: The last date (inclusive) to generate occurrences for.
+        cache: If True (default), reuse the compiled `rrule` for rules with the same
+               recurrence signature (see `_build_rrule`). Pass False to always build
+               a fresh `rrule`.
 
     Returns:
-        A list of new `PlannedFutureChange` instances, each representing a single
-        occurrence within the target month. Returns an empty list if no occurrences
-        are found, or if inputs are invalid.
+        A dict mapping `(year, month)` to the list of new `PlannedFutureChange`
+        instances occurring in that month, in date order. Months without
+        occurrences are absent. Non-recurring rules map to the rule itself.
     """
-    logger.debug(f"Getting occurrences for rule ID '{change_rule.change_id}' in {target_year}-{target_month}. "
+    logger.debug(f"Getting occurrences for rule ID '{change_rule.change_id}' from {range_start} to {range_end}. "
                  f"Rule details: Type={change_rule.change_type}, Amount={change_rule.amount}, Freq={change_rule.frequency}, "
                  f"Start={change_rule.change_date}, EndsOn={change_rule.ends_on_type}, EndsOcc={change_rule.ends_on_occurrences}, EndsDate={change_rule.ends_on_date}")
-    occurrences_in_target_month: List[PlannedFutureChange] = []
+    occurrences_by_month: Dict[Tuple[int, int], List[PlannedFutureChange]] = defaultdict(list)
     
     # Ensure the rule's own start date is a date object for comparisons.
     rule_start_date_obj = change_rule.change_date
     if isinstance(rule_start_date_obj, datetime.datetime):
         rule_start_date_obj = rule_start_date_obj.date()
 
-    # Define the datetime boundaries of the target month for rrule.between().
-    try:
-        # Start of the target month (e.g., 2023-06-01 00:00:00)
-        month_start_dt = datetime.datetime(target_year, target_month, 1)
-        # End of the target month (e.g., 2023-06-30 23:59:59.999999)
-        if target_month == 12: # Handle December specifically for year increment
-            month_end_dt = datetime.datetime(target_year, target_month, 31, 23, 59, 59, 999999)
-        else:
-            # Go to first day of next month, then subtract one microsecond.
-            month_end_dt = datetime.datetime(target_year, target_month + 1, 1) - datetime.timedelta(microseconds=1)
-    except ValueError: # Invalid year or month
-        logger.error(f"Invalid target_year ({target_year}) or target_month ({target_month}) for rule '{change_rule.change_id}'.")
-        return [] # Return empty list for invalid month/year.
-
     # --- Handle Non-Recurring Changes ---
-    # If the rule itself is a one-time event, check if it falls within the target month.
+    # If the rule itself is a one-time event, check if it falls within the range.
     if not change_rule.is_recurring:
-        if rule_start_date_obj.year == target_year and rule_start_date_obj.month == target_month:
-            # If it's a non-recurring event within the month, it is its own occurrence.
-            # Depending on desired behavior, either return the original object or a conceptual copy.
+        if range_start <= rule_start_date_obj <= range_end:
+            # A non-recurring event within the range is its own occurrence.
             # Here, we append the original rule, assuming it's treated as a single event.
             # If strict separation of rules vs. instances is needed, use _create_one_time_change_from_rule.
-             occurrences_in_target_month.append(change_rule) 
-        return occurrences_in_target_month
-
-    # --- Handle Recurring Changes: Construct rrule parameters ---
-    rrule_params: Dict[str, any] = {} # Parameters for rrule constructor
-    
-    frequency_details = FREQUENCY_CONFIG.get(change_rule.frequency)
-    if not frequency_details: # Should not happen if DB/enum constraints are good
+            occurrences_by_month[(rule_start_date_obj.year, rule_start_date_obj.month)].append(change_rule)
+        return occurrences_by_month
+
+    # --- Cheap exits for rules that cannot produce any occurrence in the range ---
+    # These only compare fields already on the rule, so they run before any rrule or datetime setup.
+    # The projection engine needs to manage cumulative counts if an AFTER_OCCURRENCES limit spans
+    # multiple months. This function generates all occurrences within the range that would be valid
+    # if the 'count' were applied from the rule's start. A limit of 0, None, or negative means no events.
+    if change_rule.ends_on_type == EndsOnType.AFTER_OCCURRENCES and (
+        change_rule.ends_on_occurrences is None or change_rule.ends_on_occurrences <= 0
+    ):
+        logger.debug(f"Rule '{change_rule.change_id}' ends after 0 or invalid occurrences. No events in range.")
+        return occurrences_by_month
+
+    # If the rule's own end date is before the range even starts, no occurrences are possible.
+    if change_rule.ends_on_type == EndsOnType.ON_DATE and change_rule.ends_on_date:
+        rule_end_date_obj = change_rule.ends_on_date
+        if isinstance(rule_end_date_obj, datetime.datetime):
+            rule_end_date_obj = rule_end_date_obj.date()
+        if rule_end_date_obj < range_start:
+            logger.debug(f"Rule '{change_rule.change_id}' ends before {range_start}. No occurrences in range.")
+            return occurrences_by_month
+
+    # --- Handle Recurring Changes: Validate the rule before building its rrule ---
+    if change_rule.frequency not in FREQUENCY_CONFIG: # Should not happen if DB/enum constraints are good
         logger.warning(
             f"Unsupported frequency type '{change_rule.frequency}' for rule ID '{change_rule.change_id}'. "
-            f"Skipping for month {target_year}-{target_month}."
+            f"Skipping for range {range_start} to {range_end}."
         )
-        return []
-
-    rrule_params['freq'] = frequency_details["rrule_const"] # e.g., rrule.MONTHLY
-    
-    # `dtstart` for rrule must be a datetime object.
-    dtstart_datetime = change_rule.change_date
-    if isinstance(dtstart_datetime, datetime.date) and not isinstance(dtstart_datetime, datetime.datetime):
-        dtstart_datetime = datetime.datetime.combine(dtstart_datetime, datetime.datetime.min.time())
-    rrule_params['dtstart'] = dtstart_datetime
-
-    # Interval for the recurrence.
-    rrule_params['interval'] = change_rule.interval if change_rule.interval and change_rule.interval > 0 else 1
+        return occurrences_by_month
 
-    # --- Determine rrule End Conditions ('until' or 'count') ---
-    # `effective_rrule_until` is the latest possible datetime an occurrence can happen
-    # based on the rule's own `ends_on_date`.
-    effective_rrule_until: Optional[datetime.datetime] = None
-    if change_rule.ends_on_type == EndsOnType.ON_DATE and change_rule.ends_on_date:
-        ends_on_date_dt = change_rule.ends_on_date
-        # Convert rule's end date to datetime, using max time to be inclusive of the whole day.
-        if isinstance(ends_on_date_dt, datetime.date) and not isinstance(ends_on_date_dt, datetime.datetime):
-            ends_on_date_dt = datetime.datetime.combine(ends_on_date_dt, datetime.datetime.max.time())
-        effective_rrule_until = ends_on_date_dt
-    
-    # Optimization: If the rule's own end date is before the target month even starts, no occurrences are possible.
-    if effective_rrule_until and effective_rrule_until < month_start_dt:
-        logger.debug(f"Rule '{change_rule.change_id}' ends before target month. No occurrences for {target_year}-{target_month}.")
-        return []
-
-    # Set 'until' for rrule. If `effective_rrule_until` is None (rule ends 'NEVER' or 'AFTER_OCCURRENCES'),
-    # rrule will generate indefinitely or up to 'count'. We later filter by month window.
-    rrule_params['until'] = effective_rrule_until 
-    
-    # Set 'count' for rrule if the rule ends after a specific number of occurrences.
-    # The projection engine needs to manage cumulative counts if this limit spans multiple months.
-    # This function will generate all occurrences within the month that would be valid if the 'count'
-    # were applied from the rule's start.
-    if change_rule.ends_on_type == EndsOnType.AFTER_OCCURRENCES:
-        if change_rule.ends_on_occurrences is not None and change_rule.ends_on_occurrences > 0:
-            rrule_params['count'] = change_rule.ends_on_occurrences
-        else: # Rule specified to end after 0, None, or negative occurrences.
-            logger.debug(f"Rule '{change_rule.change_id}' ends after 0 or invalid occurrences. No events for {target_year}-{target_month}.")
-            return [] 
+    # Define the datetime boundaries of the range for rrule.between(), inclusive of the whole end day.
+    range_start_dt = datetime.datetime.combine(range_start, datetime.datetime.min.time())
+    range_end_dt = datetime.datetime.combine(range_end, datetime.datetime.max.time())
 
-    # Apply frequency-specific rrule parameters (e.g., byweekday, bymonthday).
-    param_func = frequency_details.get("param_func")
-    if param_func: # If a specific applicator function exists for this frequency
-        param_func(change_rule, rrule_params) # Modifies rrule_params in-place
-
-    # --- Generate Occurrences using rrule ---
+    # --- Generate Occurrences ---
     try:
-        logger.debug(f"Constructed rrule_params for rule ID '{change_rule.change_id}': {rrule_params}")
-        rule_obj = rrule.rrule(**rrule_params) # Instantiate the rrule object
-        
-        # Use rrule.between() to find occurrences strictly within the target month's window.
-        # `inc=True` makes the start and end of the window inclusive.
-        generated_dates_in_window = rule_obj.between(month_start_dt, month_end_dt, inc=True)
-
-        for occ_datetime in generated_dates_in_window:
-            occurrence_date = occ_datetime.date() # Convert to date object
-            
+        # Simple rule shapes are computed with date arithmetic; everything else walks an rrule.
+        occurrence_dates = _arithmetic_occurrence_dates(change_rule, rule_start_date_obj, range_start, range_end)
+        if occurrence_dates is None:
+            signature = _rule_signature(change_rule)
+            # The compiled rrule only depends on the rule's recurrence fields, so repeated calls for the
+            # same rule reuse one instance instead of rebuilding it each time.
+            rule_obj = _build_rrule(signature) if cache else _build_rrule.__wrapped__(signature)
+            # Use rrule.between() to find occurrences within the range.
+            # `inc=True` makes the start and end of the window inclusive.
+            occurrence_dates = (occ_datetime.date() for occ_datetime in rule_obj.between(range_start_dt, range_end_dt, inc=True))
+
+        template_fields: Optional[Dict[str, Any]] = None # Built on the first occurrence, shared by the rest
+        for occurrence_date in occurrence_dates:
             # Final check: ensure the generated occurrence is not before the rule's original start date.
             # This is mainly a safeguard, as rrule's dtstart should handle this, but complex rules
             # (e.g., with bysetpos=-1 on a month where dtstart is late) might need it.
             if occurrence_date >= rule_start_date_obj:
-                new_occurrence_event = _create_one_time_change_from_rule(change_rule, occurrence_date)
-                occurrences_in_target_month.append(new_occurrence_event)
+                if template_fields is None:
+                    template_fields = _one_time_change_fields(change_rule)
+                new_occurrence_event = _create_one_time_change_from_rule(
+                    change_rule, occurrence_date, template_fields=template_fields
+                )
+                occurrences_by_month[(occurrence_date.year, occurrence_date.month)].append(new_occurrence_event)
                 
     except Exception as e: # Catch any error during rrule processing.
         logger.error(
-            f"Error generating monthly occurrences for Rule ID '{change_rule.change_id}' "
+            f"Error generating occurrences for Rule ID '{change_rule.change_id}' "
             f"(PortfolioID '{change_rule.portfolio_id}', Rule Start '{change_rule.change_date}') "
-            f"for target month {target_year}-{target_month}: {e}", 
+            f"for range {range_start} to {range_end}: {e}", 
             exc_info=True # Log full traceback for debugging.
         )
 
-    logger.debug(f"Generated {len(occurrences_in_target_month)} occurrences for rule '{change_rule.change_id}' in {target_year}-{target_month}.")
-    return occurrences_in_target_month
+    logger.debug(f"Generated occurrences for rule '{change_rule.change_id}' in {len(occurrences_by_month)} months "
+                 f"between {range_start} and {range_end}.")
+    return occurrences_by_month
+
+def get_occurrences_for_month(
+    change_rule: PlannedFutureChange, 
+    target_year: int, 
+    target_month: int,
+    *,
+    cache: bool = True
+) -> List[PlannedFutureChange]:
+    """Generates all occurrences for a given `PlannedFutureChange` rule that fall
+    within the specified `target_year` and `target_month`.
+
+    This is a thin wrapper around `get_occurrences_for_range` for a single month.
+    The `rrule` is built from the `change_rule`'s properties (frequency, interval,
+    specific day/date conditions, end conditions) and queried for occurrences within
+    the boundaries of the target month. Each found occurrence date results in a new,
+    non-recurring `PlannedFutureChange` instance created by `_create_one_time_change_from_rule`.
+
+    The function respects the rule's own end conditions (e.g., `ends_on_date`,
+    `ends_on_occurrences`). However, for rules with `ends_on_occurrences`, the
+    calling context (e.g., projection engine) is responsible for managing the
+    cumulative count of generated occurrences if the rule spans multiple months
+    to ensure the total limit is not exceeded across the entire projection. This
+    function itself will generate all occurrences within the month that would be
+    valid if the 'count' limit were applied to the rrule directly from its start.
+
+    Args:
+        change_rule: The `PlannedFutureChange` ORM object defining the recurrence.
+        target_year: The year of the target month.
+        target_month: The month number (1-12) of the target month.
+        cache: If True (default), reuse the compiled `rrule` for rules with the same
+               recurrence signature (see `_build_rrule`). Pass False to always build
+               a fresh `rrule`.
+
+    Returns:
+        A list of new `PlannedFutureChange` instances, each representing a single
+        occurrence within the target month. Returns an empty list if no occurrences
+        are found, or if inputs are invalid.
+    """
+    # Define the date boundaries of the target month.
+    try:
+        month_start = datetime.date(target_year, target_month, 1)
+        # Go to first day of next month, then subtract one day.
+        month_end = (month_start + datetime.timedelta(days=31)).replace(day=1) - datetime.timedelta(days=1)
+    except (ValueError, OverflowError): # Invalid year or month
+        logger.error(f"Invalid target_year ({target_year}) or target_month ({target_month}) for rule '{change_rule.change_id}'.")
+        return [] # Return empty list for invalid month/year.
+
+    # A non-recurring rule is its own (only) occurrence. Compare its month directly instead of
+    # building the range lookup, since a caller sweeping months mostly hits the "no match" case.
+    # A fresh list is returned either way because callers may extend the result.
+    if not change_rule.is_recurring:
+        rule_date = change_rule.change_date
+        if (rule_date.year, rule_date.month) == (target_year, target_month):
+            return [change_rule]
+        return []
+
+    occurrences_by_month = get_occurrences_for_range(change_rule, month_start, month_end, cache=cache)
+    return occurrences_by_month.get((target_year, target_month), [])
 
 # The _expand_single_recurring_change function is marked as DEPRECATED in its docstring.
 # It's kept for reference or testing of rrule parameter logic, as it's similar to parts of
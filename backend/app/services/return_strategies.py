@@ -12,7 +12,8 @@ strategy for a given asset type. Default annual returns are sourced from
 `app.config.return_config`.
 """
 from abc import ABC, abstractmethod # For defining abstract strategy classes
-from decimal import Decimal, InvalidOperation # For precise financial calculations
+from decimal import Decimal, InvalidOperation, getcontext # For precise financial calculations
+from functools import lru_cache
 import logging # For logging warnings and errors
 from typing import List, Dict, Any, Callable, Optional
 
@@ -25,6 +26,26 @@ from app.config.return_config import DEFAULT_ANNUAL_RETURNS
 # Initialize a logger for this module.
 logger = logging.getLogger(__name__) 
 
+# --- Annual to Monthly Conversion ---
+
+@lru_cache(maxsize=256)
+def _monthly_from_annual_fraction(r_annual_decimal_fraction: Decimal, precision: int) -> Decimal:
+    """Converts an annual return fraction to the equivalent monthly return fraction.
+
+    Formula: (1 + R_annual)^(1/12) - 1, using Decimal's __pow__ operator for precision.
+    A fractional Decimal power is an iterative computation, while portfolios usually
+    share a handful of annual rates (the per-type defaults and common manual values),
+    so results are cached. `precision` is the active Decimal context precision; it is
+    part of the cache key because it determines the result's digits.
+
+    Raises:
+        InvalidOperation: If the power cannot be computed (not cached; callers handle it).
+    """
+    # Calculate (1 + R_annual)^(1/12)
+    base_for_power = Decimal('1.0') + r_annual_decimal_fraction
+    monthly_factor = base_for_power ** (Decimal('1.0') / Decimal('12.0'))
+    return monthly_factor - Decimal('1.0')
+
 # --- Abstract Return Calculation Strategy ---
 
 class AbstractReturnCalculationStrategy(ABC):
@@ -120,11 +141,7 @@ class StandardAnnualReturnStrategy(AbstractReturnCalculationStrategy):
              return Decimal('-1.0') # Represents -100% monthly return (total loss)
 
         try:
-            # Calculate (1 + R_annual)^(1/12)
-            base_for_power = Decimal('1.0') + r_annual_decimal_fraction
-            # Using Decimal's __pow__ operator for precision.
-            monthly_factor = base_for_power ** (Decimal('1.0') / Decimal('12.0'))
-            monthly_return_decimal_fraction = monthly_factor - Decimal('1.0')
+            monthly_return_decimal_fraction = _monthly_from_annual_fraction(r_annual_decimal_fraction, getcontext().prec)
         except InvalidOperation as e:
             # This might occur for very unusual base_for_power values with fractional exponents,
             # though `r_annual_decimal_fraction > -1.0` check should prevent most.
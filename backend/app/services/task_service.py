@@ -5,6 +5,8 @@ This module provides functions to retrieve the status and results of
 background tasks managed by Celery. It uses Celery's `AsyncResult`
 to query the task state from the Celery backend (e.g., Redis, RabbitMQ).
 """
+from dataclasses import dataclass
+from typing import Any, Optional
 from flask import current_app # For accessing application logger
 from datetime import datetime # Potentially for timestamping, though Celery provides date_done
 from celery.result import AsyncResult # Used to query Celery task states
@@ -13,7 +15,45 @@ from celery.result import AsyncResult # Used to query Celery task states
 # correctly connect to the Celery backend (e.g., Redis, RabbitMQ) and fetch task info.
 from app import celery_app 
 
-def get_task_status(task_id: str) -> dict:
+@dataclass(frozen=True, slots=True)
+class TaskStatusResponse:
+    """Status information for a single Celery task, as returned by `get_task_status`.
+
+    Attributes:
+        task_id: The task's ID.
+        status: The application-specific status (e.g., "PENDING", "PROCESSING",
+                "COMPLETED", "FAILED", "UNKNOWN_ERROR").
+        result: The task's result if it completed successfully.
+        message: A human-readable message describing the task's state.
+        error: Error message or traceback if the task failed.
+        created_at: Placeholder; Celery's AsyncResult doesn't directly store task creation time.
+        updated_at: ISO 8601 timestamp of when the task finished, if available.
+    """
+    task_id: str
+    status: str
+    result: Optional[Any] = None
+    message: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        """Returns the response as a plain dictionary for JSON serialization.
+
+        Built field by field rather than with `dataclasses.asdict`, which would deep-copy
+        the (potentially large) task `result`.
+        """
+        return {
+            "task_id": self.task_id,
+            "status": self.status,
+            "result": self.result,
+            "message": self.message,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+def get_task_status(task_id: str) -> TaskStatusResponse:
     """Retrieves the status and result of a Celery task by its ID.
 
     This function queries the Celery backend for a task's current state,
@@ -25,7 +65,7 @@ def get_task_status(task_id: str) -> dict:
         task_id: The unique identifier of the Celery task.
         
     Returns:
-        A dictionary containing task status information:
+        A `TaskStatusResponse` containing task status information:
             - task_id (str): The task's ID.
             - status (str): The application-specific status (e.g., "PENDING", "PROCESSING",
                             "COMPLETED", "FAILED", "UNKNOWN_ERROR").
@@ -126,20 +166,20 @@ def get_task_status(task_id: str) -> dict:
         if task_result.date_done: # Timestamp for when the task finished (SUCCESS or FAILURE)
             try:
                 iso_date_done = task_result.date_done.isoformat()
-            except AttributeError: # Should not happen if date_done is a datetime object
+            except (AttributeError, TypeError): # Should not happen if date_done is a datetime object
                 current_app.logger.warning(f"TaskID '{task_id}': 'date_done' attribute '{task_result.date_done}' could not be ISO formatted.")
         current_app.logger.debug(f"TaskID '{task_id}': Completion timestamp (ISO): {iso_date_done}.")
 
         # Construct the final API response.
-        response_payload = {
-            "task_id": task_id,
-            "status": application_status,
-            "result": api_response_result,
-            "message": api_response_message,
-            "error": api_response_error_details,
-            "created_at": None, # Placeholder - consider fetching from UserCeleryTask table if needed
-            "updated_at": iso_date_done # Reflects when task processing ended
-        }
+        response_payload = TaskStatusResponse(
+            task_id=task_id,
+            status=application_status,
+            result=api_response_result,
+            message=api_response_message,
+            error=api_response_error_details,
+            created_at=None, # Placeholder - consider fetching from UserCeleryTask table if needed
+            updated_at=iso_date_done # Reflects when task processing ended
+        )
         current_app.logger.info(f"TaskID '{task_id}': Successfully prepared status response.")
         current_app.logger.debug(f"TaskID '{task_id}': Final response payload: {response_payload}")
         return response_payload
@@ -150,12 +190,12 @@ def get_task_status(task_id: str) -> dict:
             exc_info=True # Log full traceback for unexpected errors.
         )
         # Return a standardized error structure for internal server errors.
-        return {
-            "task_id": task_id,
-            "status": "UNKNOWN_ERROR", # Indicates an error in the status retrieval itself
-            "result": None,
-            "message": "An internal server error occurred while fetching task status.",
-            "error": str(e), # Provide error string for debugging if appropriate
-            "created_at": None,
-            "updated_at": None
-        }
+        return TaskStatusResponse(
+            task_id=task_id,
+            status="UNKNOWN_ERROR", # Indicates an error in the status retrieval itself
+            result=None,
+            message="An internal server error occurred while fetching task status.",
+            error=str(e), # Provide error string for debugging if appropriate
+            created_at=None,
+            updated_at=None
+        )
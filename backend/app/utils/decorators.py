@@ -8,7 +8,7 @@ database session management (commit/rollback).
 import logging # Standard Python logging
 import functools # For creating well-behaved decorators
 from flask import request, jsonify, abort, current_app # Flask utilities
-from pydantic import ValidationError # For Pydantic schema validation errors
+from pydantic import TypeAdapter, ValidationError # Reusable schema validators and their validation errors
 from app import db # SQLAlchemy database session from the main app
 from decimal import InvalidOperation # For handling errors with Decimal conversions
 
@@ -24,7 +24,7 @@ def handle_api_errors(schema=None):
     1.  **JSON Parsing**: For POST, PUT, PATCH methods, it checks if the request
         content type is 'application/json' and parses the JSON body.
         - Aborts with 415 if content type is not JSON.
-        - Aborts with 400 if JSON body is missing or null.
+        - Aborts with 400 if JSON body is missing, null or malformed.
     2.  **Data Validation**: If a Pydantic `schema` is provided, it validates
         the parsed JSON data against this schema.
         - If validation fails, it logs the error and returns a 400 JSON response
@@ -57,6 +57,11 @@ def handle_api_errors(schema=None):
         Callable: The actual decorator that wraps the route function.
     """
     def decorator(f):
+        # Build the schema's validator once per decorated route instead of going through
+        # `schema.model_validate()` on every request. Validating through the adapter returns
+        # the same schema instance and raises the same `ValidationError`.
+        schema_adapter = TypeAdapter(schema) if schema else None
+
         @functools.wraps(f) # Preserves metadata of the decorated function (name, docstring, etc.)
         def wrapper(*args, **kwargs):
             # Process request body for methods that typically carry a payload.
@@ -71,19 +76,22 @@ def handle_api_errors(schema=None):
                      # Abort with 415 for unsupported media type.
                      abort(415, description="Unsupported Media Type: Request must be application/json.")
 
-                json_data = request.get_json() # Parses JSON from request body.
-                # Check if JSON parsing yielded None (e.g., empty body, or malformed JSON that wasn't caught by Flask's default).
+                # Parses JSON from the request body. `silent=True` returns None for a malformed body
+                # instead of raising Flask's BadRequest, so it is handled by the same 400 check as an
+                # empty or null body below. The parsed result is cached on the request either way.
+                json_data = request.get_json(silent=True)
+                # Check if JSON parsing yielded None (empty body, malformed JSON, or a literal null).
                 if json_data is None: 
                     current_app.logger.warning(
-                        f"Empty or null JSON body received for {request.method} {request.path}. IP: {request.remote_addr}"
+                        f"Empty, null or malformed JSON body received for {request.method} {request.path}. IP: {request.remote_addr}"
                     )
                     abort(400, description="Request body cannot be empty or null. Valid JSON is required.")
 
                 # If a Pydantic schema is provided, validate the JSON data.
                 if schema:
                     try:
-                        # `schema.model_validate()` is Pydantic v2+ method. For v1, it was `schema.parse_obj()`.
-                        validated_data = schema.model_validate(json_data)
+                        # Equivalent to the Pydantic v2 `schema.model_validate(json_data)`.
+                        validated_data = schema_adapter.validate_python(json_data)
                         # Inject validated data into the route function's keyword arguments.
                         kwargs['validated_data'] = validated_data
                     except ValidationError as e: